@@ -0,0 +1,823 @@
+"""
+Shared Brevo transport used by the MCP servers: configuration, the REST
+session and helpers (gmail.py), and the pooled SMTP sender (gmail_ai.py)
+"""
+import atexit
+import base64
+import hashlib
+import html
+import orjson
+import os
+import queue
+import requests
+import secrets
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.header import Header
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# Load env only if not in Docker/production
+if os.getenv("ENV") != "production":
+    load_dotenv()
+
+
+@dataclass(frozen=True, slots=True)
+class _Cfg:
+    """
+    Environment configuration, resolved once instead of on every call
+    """
+    api_key: str
+    groq_api_key: str | None
+    smtp_server: str
+    smtp_port: int
+    smtp_login: str | None
+    smtp_password: str | None
+    from_email: str | None
+    smtp_pool_size: int
+    smtp_max_per_conn: int
+
+
+def _int_env(name: str, default: int) -> int:
+    """
+    Read a positive integer setting, falling back to the default when it is
+    malformed, so a bad SMTP-only value can't stop the REST server importing
+    """
+    try:
+        value = int(os.getenv(name, default))
+    except ValueError:
+        return default
+    return value if value >= 1 else default
+
+
+def _load_config() -> _Cfg:
+    return _Cfg(
+        api_key=os.getenv("BREVO_API_KEY", ""),
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        smtp_server=os.getenv("SMTP_SERVER", "smtp-relay.brevo.com"),
+        smtp_port=_int_env("SMTP_PORT", 587),
+        smtp_login=os.getenv("SMTP_LOGIN"),
+        smtp_password=os.getenv("SMTP_PASSWORD"),
+        from_email=os.getenv("SMTP_FROM_EMAIL"),
+        smtp_pool_size=_int_env("SMTP_POOL_SIZE", 4),
+        smtp_max_per_conn=_int_env("SMTP_MAX_MESSAGES_PER_CONNECTION", 1000)
+    )
+
+
+_CFG = _load_config()
+
+
+def reload_config() -> None:
+    """
+    Re-read configuration from the environment (e.g. in tests)
+    """
+    global _CFG
+    _CFG = _load_config()
+    _SESSION.headers["api-key"] = _CFG.api_key
+
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket; acquire() blocks until a request may be sent
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Client-side rate limits kept just below Brevo's server-side caps, so bursts
+# queue locally instead of failing with 429 (/v3/smtp/email allows 1000 RPS,
+# SMS and WhatsApp endpoints 150 RPS)
+_EMAIL_LIMITER = _TokenBucket(900)
+_MESSAGING_LIMITER = _TokenBucket(140)
+
+
+class _BrevoRetry(Retry):
+    """
+    Retry policy for Brevo calls that never re-sends a POST Brevo may have processed.
+
+    Each retry also takes a token from the endpoint's rate limiter, since urllib3
+    retries internally and would otherwise bypass it.
+    """
+
+    def __init__(self, *args, limiter: _TokenBucket = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def new(self, **kw) -> "_BrevoRetry":
+        retry = super().new(**kw)
+        retry.limiter = self.limiter
+        return retry
+
+    def sleep(self, response=None) -> None:
+        super().sleep(response)
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        # Brevo's send endpoints take no idempotency key, so a POST that got a
+        # 5xx may already have been delivered. A 429 is rejected before any
+        # processing, so that is the only status safe to resend.
+        if method.upper() == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class _LimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that takes a rate limiter token before sending a request
+    """
+
+    def __init__(self, limiter: _TokenBucket, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire()
+        return super().send(request, **kwargs)
+
+
+def _brevo_adapter(limiter: _TokenBucket) -> _LimitedAdapter:
+    return _LimitedAdapter(
+        limiter,
+        pool_connections=4,
+        pool_maxsize=32,
+        # Back off and retry, honoring Brevo's Retry-After header. DELETE is in
+        # urllib3's default allowed_methods and is retried on 429 and 5xx; POST is
+        # left out of allowed_methods so read errors are never retried for it, and
+        # _BrevoRetry opts it back in for 429 only.
+        max_retries=_BrevoRetry(total=5, backoff_factor=0.25, status_forcelist=[429, 500, 502, 503, 504],
+                                respect_retry_after_header=True, raise_on_status=False, limiter=limiter)
+    )
+
+
+# Shared keep-alive session for all Brevo REST calls so the TCP/TLS
+# connection to api.brevo.com is reused instead of re-handshaking per call.
+# Each endpoint class is mounted with its own rate limiter, applied to every
+# attempt including retries.
+_SESSION = requests.Session()
+_SESSION.mount("https://api.brevo.com/v3/smtp/", _brevo_adapter(_EMAIL_LIMITER))
+_MESSAGING_ADAPTER = _brevo_adapter(_MESSAGING_LIMITER)
+_SESSION.mount("https://api.brevo.com/v3/transactionalSMS/", _MESSAGING_ADAPTER)
+_SESSION.mount("https://api.brevo.com/v3/whatsapp/", _MESSAGING_ADAPTER)
+# Headers are identical for every Brevo call, so set them once on the session.
+# Payloads are pre-serialized with orjson, hence the explicit content-type.
+_SESSION.headers.update({
+    "accept": "application/json",
+    "content-type": "application/json",
+    "api-key": _CFG.api_key
+})
+
+
+# Worker threads for bulk sends; sized to the session's connection pool so
+# concurrent requests share the pooled keep-alive connections
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="brevo")
+
+# Maximum number of messageVersions Brevo accepts in one send request
+_BATCH_SIZE = 100
+
+# Translation table for rendering escaped plain text as HTML line breaks
+_NL_TABLE = str.maketrans({"\n": "<br>"})
+
+# Negative cache of sends Brevo rejected as invalid (400/422), keyed by a hash
+# of the message, so identical retries fail fast instead of re-hitting the API
+_NEG_CACHE = OrderedDict()
+_NEG_CACHE_LOCK = threading.Lock()
+_NEG_CACHE_MAX = 4096
+_NEG_CACHE_TTL = 300
+_NEG_CACHE_STATUSES = (400, 422)
+
+
+def _neg_cache_get(key: str) -> dict | None:
+    """
+    Return the cached failure for key if it is still within the TTL
+    """
+    with _NEG_CACHE_LOCK:
+        hit = _NEG_CACHE.get(key)
+        if hit is None:
+            return None
+        stored_at, result = hit
+        if time.monotonic() - stored_at >= _NEG_CACHE_TTL:
+            del _NEG_CACHE[key]
+            return None
+        _NEG_CACHE.move_to_end(key)
+        return result
+
+
+def _neg_cache_put(key: str, result: dict) -> None:
+    """
+    Remember a failed send, evicting the least recently used entry when full
+    """
+    with _NEG_CACHE_LOCK:
+        _NEG_CACHE[key] = (time.monotonic(), result)
+        _NEG_CACHE.move_to_end(key)
+        if len(_NEG_CACHE) > _NEG_CACHE_MAX:
+            _NEG_CACHE.popitem(last=False)
+
+
+def _mkpayload(to_email: str, subject: str, body: str, **extra) -> dict:
+    """
+    Build the recipient + content part of a Brevo email payload
+    Args:
+        extra: Additional top-level fields (e.g. sender, scheduledAt)
+    """
+    html_body = html.escape(body).translate(_NL_TABLE)
+    return {
+        "to": [{"email": to_email}],
+        "subject": subject,
+        "htmlContent": f"<html><body>{html_body}</body></html>",
+        "textContent": body,
+        **extra
+    }
+
+
+def send_email_via_brevo(to_email: str, subject: str, body: str, from_email: str = None, 
+                          message_id: str = None, references: str = None) -> dict:
+    """
+    Send email using Brevo REST API
+    Args:
+        message_id: Optional Message-ID to reply to (for threading)
+        references: Optional References header (for threading)
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+        smtp_from_email = _CFG.from_email
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        if not from_email:
+            from_email = smtp_from_email
+
+        # Fail fast if this exact message was recently rejected as invalid
+        cache_key = hashlib.blake2b(
+            "\0".join((from_email or "", to_email, subject, body, message_id or "", references or "")).encode(),
+            digest_size=16
+        ).hexdigest()
+        cached = _neg_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Build email payload
+        payload = _mkpayload(to_email, subject, body, sender={"email": from_email})
+        
+        # Add threading headers if this is a reply
+        if message_id:
+            headers = {
+                "In-Reply-To": message_id
+            }
+            if references:
+                headers["References"] = f"{references} {message_id}"
+            else:
+                headers["References"] = message_id
+            
+            payload["headers"] = headers
+
+        # Send email via Brevo API
+        response = _SESSION.post(
+            "https://api.brevo.com/v3/smtp/email",
+            data=orjson.dumps(payload)
+        )
+
+        if response.status_code in [200, 201]:
+            result = response.json()
+            return {
+                "success": True, 
+                "message": f"Email sent successfully to {to_email}",
+                "message_id": result.get("messageId", "N/A")
+            }
+        else:
+            result = {
+                "success": False, 
+                "message": f"Failed to send email: {response.status_code} - {response.text}"
+            }
+            if response.status_code in _NEG_CACHE_STATUSES:
+                _neg_cache_put(cache_key, result)
+            return result
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to send email: {str(e)}"}
+
+
+def send_email_batch(messages: list, from_email: str = None) -> dict:
+    """
+    Send up to 100 emails in a single Brevo REST API call using messageVersions
+    Args:
+        messages: List of dicts with "to_email", "subject" and "body" keys
+        from_email: Optional sender email shared by every message in the batch
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+        smtp_from_email = _CFG.from_email
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        if not messages:
+            return {"success": False, "message": "No messages provided"}
+
+        if len(messages) > _BATCH_SIZE:
+            return {"success": False, "message": f"A batch can contain at most {_BATCH_SIZE} messages"}
+
+        if not from_email:
+            from_email = smtp_from_email
+
+        # Build one message version per recipient
+        versions = [_mkpayload(m["to_email"], m["subject"], m["body"]) for m in messages]
+
+        # Top-level content is required by Brevo; each version overrides it
+        payload = {
+            "sender": {"email": from_email},
+            "subject": versions[0]["subject"],
+            "htmlContent": versions[0]["htmlContent"],
+            "textContent": versions[0]["textContent"],
+            "messageVersions": versions
+        }
+
+        # Send batch via Brevo API
+        response = _SESSION.post(
+            "https://api.brevo.com/v3/smtp/email",
+            data=orjson.dumps(payload)
+        )
+
+        if response.status_code in [200, 201]:
+            result = response.json()
+            return {
+                "success": True,
+                "message": f"Batch of {len(messages)} emails sent successfully",
+                "message_ids": result.get("messageIds", [])
+            }
+        else:
+            return {
+                "success": False,
+                "message": f"Failed to send email batch: {response.status_code} - {response.text}"
+            }
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to send email batch: {str(e)}"}
+
+
+def send_emails_concurrently(messages: list, from_email: str = None) -> list:
+    """
+    Send many emails as 100-message batches, dispatched in parallel over the shared Brevo session
+    Args:
+        messages: List of dicts with "to_email", "subject" and "body" keys
+        from_email: Optional sender email applied to every message
+    Returns:
+        List of (batch, send_email_batch result) tuples, in the same order as messages
+    """
+    batches = [messages[i:i + _BATCH_SIZE] for i in range(0, len(messages), _BATCH_SIZE)]
+    futures = [_EXECUTOR.submit(send_email_batch, batch, from_email) for batch in batches]
+    return [(batch, f.result()) for batch, f in zip(batches, futures)]
+
+
+def send_sms_via_brevo(recipient: str, content: str, sender: str = None, 
+                       sms_type: str = "transactional", unicode_enabled: bool = False) -> dict:
+    """
+    Send SMS using Brevo REST API
+    Args:
+        recipient: Phone number with country code (e.g., "33680065433" or "+33680065433")
+        content: SMS message content
+        sender: Sender name (alphanumeric, max 11 chars) or phone number
+        sms_type: "transactional" or "marketing" (use marketing if content has opt-out)
+        unicode_enabled: Enable unicode for special characters
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        # Build SMS payload
+        payload = {
+            "sender": sender,
+            "recipient": recipient,
+            "content": content,
+            "type": sms_type,
+            "unicodeEnabled": unicode_enabled
+        }
+
+        # Send SMS via Brevo API
+        response = _SESSION.post(
+            "https://api.brevo.com/v3/transactionalSMS/send",
+            data=orjson.dumps(payload)
+        )
+
+        if response.status_code in [200, 201]:
+            result = response.json()
+            return {
+                "success": True, 
+                "message": f"SMS sent successfully to {recipient}",
+                "message_id": result.get("messageId", "N/A")
+            }
+        else:
+            return {
+                "success": False, 
+                "message": f"Failed to send SMS: {response.status_code} - {response.text}"
+            }
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to send SMS: {str(e)}"}
+
+
+def send_whatsapp_via_brevo(contact_numbers: list, sender_number: str, 
+                             template_id: int = None, text: str = None) -> dict:
+    """
+    Send WhatsApp message using Brevo REST API
+    Args:
+        contact_numbers: List of phone numbers with country code (e.g., ["4915778559164"])
+        sender_number: Your WhatsApp Business number (e.g., "917878172050")
+        template_id: Template ID (required for first message to a contact)
+        text: Message text (can be used after first template message)
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        if not template_id and not text:
+            return {"success": False, "message": "Either template_id or text must be provided"}
+
+        # Build WhatsApp payload
+        payload = {
+            "contactNumbers": contact_numbers,
+            "senderNumber": sender_number
+        }
+        
+        if template_id:
+            payload["templateId"] = template_id
+        if text:
+            payload["text"] = text
+
+        # Send WhatsApp message via Brevo API
+        response = _SESSION.post(
+            "https://api.brevo.com/v3/whatsapp/sendMessage",
+            data=orjson.dumps(payload)
+        )
+
+        if response.status_code in [200, 201]:
+            result = response.json()
+            return {
+                "success": True, 
+                "message": f"WhatsApp message sent successfully to {', '.join(contact_numbers)}",
+                "response": result
+            }
+        else:
+            return {
+                "success": False, 
+                "message": f"Failed to send WhatsApp: {response.status_code} - {response.text}"
+            }
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to send WhatsApp: {str(e)}"}
+
+
+def schedule_email_via_brevo(to_email: str, subject: str, body: str, scheduled_at: str,
+                              from_email: str = None, batch_id: str = None) -> dict:
+    """
+    Schedule an email to be sent later using Brevo REST API
+    Args:
+        to_email: Recipient email address
+        subject: Email subject
+        body: Email body content
+        scheduled_at: ISO 8601 datetime (e.g., "2024-10-16T15:30:00+05:30")
+        from_email: Optional sender email
+        batch_id: Optional batch ID to group multiple scheduled emails
+    Note: Can schedule up to 72 hours in the future
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+        smtp_from_email = _CFG.from_email
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        if not from_email:
+            from_email = smtp_from_email
+
+        # Build email payload with scheduling
+        payload = _mkpayload(to_email, subject, body, sender={"email": from_email},
+                             scheduledAt=scheduled_at)
+        
+        # Add batch ID if provided
+        if batch_id:
+            payload["batchId"] = batch_id
+
+        # Schedule email via Brevo API
+        response = _SESSION.post(
+            "https://api.brevo.com/v3/smtp/email",
+            data=orjson.dumps(payload)
+        )
+
+        if response.status_code in [200, 201]:
+            result = response.json()
+            return {
+                "success": True, 
+                "message": f"Email scheduled successfully for {to_email} at {scheduled_at}",
+                "message_id": result.get("messageId", "N/A"),
+                "batch_id": batch_id if batch_id else "N/A"
+            }
+        else:
+            return {
+                "success": False, 
+                "message": f"Failed to schedule email: {response.status_code} - {response.text}"
+            }
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to schedule email: {str(e)}"}
+
+
+def delete_scheduled_email_via_brevo(identifier: str) -> dict:
+    """
+    Delete scheduled email using Brevo REST API
+    Args:
+        identifier: batchId or messageId of the scheduled email to delete
+    """
+    try:
+        # Read cached configuration
+        api_key = _CFG.api_key
+
+        if not api_key:
+            return {"success": False, "message": "BREVO_API_KEY not found in environment variables"}
+
+        # Delete scheduled email via Brevo API
+        response = _SESSION.delete(
+            f"https://api.brevo.com/v3/smtp/email/{identifier}"
+        )
+
+        if response.status_code in [200, 204]:
+            return {
+                "success": True, 
+                "message": f"Scheduled email(s) with identifier '{identifier}' deleted successfully"
+            }
+        else:
+            return {
+                "success": False, 
+                "message": f"Failed to delete scheduled email: {response.status_code} - {response.text}"
+            }
+
+    except Exception as e:
+        return {"success": False, "message": f"Failed to delete scheduled email: {str(e)}"}
+
+
+# Persistent SMTP connections keyed by (server, port, login).
+# Each key maps to a queue of SMTP_POOL_SIZE entries {"conn", "last_used",
+# "sent_count"}; an entry is checked out exclusively for one send since
+# smtplib.SMTP is not thread-safe, and its connection is opened lazily on
+# first use and recycled after SMTP_MAX_MESSAGES_PER_CONNECTION messages.
+# "last_used" is when the server last answered on the connection.
+_SMTP_POOL = {}
+_SMTP_POOL_LOCK = threading.Lock()
+
+# A connection the server answered on this recently is reused without a NOOP
+# probe, saving a round-trip per back-to-back send
+_SMTP_FRESH_SECONDS = 5.0
+
+# Worker threads for bulk SMTP sends, one per pooled SMTP connection
+_SMTP_EXECUTOR = ThreadPoolExecutor(max_workers=_CFG.smtp_pool_size, thread_name_prefix="smtp")
+
+
+def _close_smtp(conn: smtplib.SMTP) -> None:
+    """
+    Close an SMTP connection, ignoring errors from an already dead socket
+    """
+    try:
+        conn.quit()
+    except (smtplib.SMTPException, OSError):
+        conn.close()
+
+
+def _get_pool(smtp_server: str, smtp_port: int, smtp_login: str) -> queue.LifoQueue:
+    """
+    Return the connection pool for the given SMTP credentials, creating it if needed
+    """
+    key = (smtp_server, smtp_port, smtp_login)
+    with _SMTP_POOL_LOCK:
+        pool = _SMTP_POOL.get(key)
+        if pool is None:
+            # LIFO hands out the most recently used (still warm) connection first
+            pool = queue.LifoQueue()
+            for _ in range(_CFG.smtp_pool_size):
+                pool.put({"conn": None, "last_used": 0.0, "sent_count": 0})
+            _SMTP_POOL[key] = pool
+        return pool
+
+
+def _get_or_connect(entry: dict, smtp_server: str, smtp_port: int,
+                    smtp_login: str, smtp_password: str) -> smtplib.SMTP:
+    """
+    Return a live, authenticated SMTP connection for a pool entry.
+
+    A connection used within the last _SMTP_FRESH_SECONDS is returned as is;
+    an older one is probed with NOOP and transparently replaced
+    (connect + STARTTLS + AUTH) if the server has dropped it.
+    Must only be called on an entry checked out of its pool.
+    """
+    conn = entry["conn"]
+    if conn is not None:
+        if time.monotonic() - entry["last_used"] < _SMTP_FRESH_SECONDS:
+            return conn
+        try:
+            if conn.noop()[0] == 250:
+                entry["last_used"] = time.monotonic()
+                return conn
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp(conn)
+        entry["conn"] = None
+
+    conn = smtplib.SMTP(smtp_server, smtp_port)
+    try:
+        conn.starttls()
+        conn.login(smtp_login, smtp_password)
+    except Exception:
+        _close_smtp(conn)
+        raise
+
+    entry["conn"] = conn
+    entry["sent_count"] = 0
+    entry["last_used"] = time.monotonic()
+    return conn
+
+
+@atexit.register
+def _close_smtp_pool() -> None:
+    """
+    Quit all pooled SMTP connections on process exit
+    """
+    with _SMTP_POOL_LOCK:
+        for pool in _SMTP_POOL.values():
+            for entry in list(pool.queue):
+                if entry["conn"] is not None:
+                    _close_smtp(entry["conn"])
+                    entry["conn"] = None
+
+
+def _build_message(from_email: str, to_email: str, subject: str, body: str) -> bytes:
+    """
+    Build a multipart/alternative (plain text + HTML) RFC 5322 message.
+
+    Equivalent to MIMEMultipart with two MIMEText parts, but emitted
+    directly as bytes instead of going through the email package.
+    """
+    for value in (from_email, to_email, subject):
+        if "\r" in value or "\n" in value:
+            raise ValueError("Header values must not contain line breaks")
+
+    if not subject.isascii():
+        subject = Header(subject, "utf-8").encode()
+
+    html_body = html.escape(body).translate(_NL_TABLE)
+    text_part = base64.encodebytes(body.encode("utf-8")).decode("ascii")
+    html_part = base64.encodebytes(
+        f"<html><body>{html_body}</body></html>".encode("utf-8")
+    ).decode("ascii")
+
+    boundary = "=_Boundary_" + secrets.token_hex(8)
+    raw = (
+        f"From: {from_email}\nTo: {to_email}\nSubject: {subject}\n"
+        f"MIME-Version: 1.0\nContent-Type: multipart/alternative; boundary=\"{boundary}\"\n\n"
+        f"--{boundary}\nContent-Type: text/plain; charset=\"utf-8\"\n"
+        f"Content-Transfer-Encoding: base64\n\n{text_part}"
+        f"--{boundary}\nContent-Type: text/html; charset=\"utf-8\"\n"
+        f"Content-Transfer-Encoding: base64\n\n{html_part}"
+        f"--{boundary}--\n"
+    )
+    # encodebytes() emits bare LF line endings, so convert everything to CRLF once
+    return raw.replace("\n", "\r\n").encode("ascii")
+
+
+def ensure_smtp_connected() -> None:
+    """
+    Open (or verify) a pooled SMTP connection ahead of a send
+    """
+    cfg = _CFG
+    if not cfg.smtp_login or not cfg.smtp_password:
+        return
+    
+    pool = _get_pool(cfg.smtp_server, cfg.smtp_port, cfg.smtp_login)
+    entry = pool.get()
+    try:
+        _get_or_connect(entry, cfg.smtp_server, cfg.smtp_port, cfg.smtp_login, cfg.smtp_password)
+    finally:
+        pool.put(entry)
+
+
+def send_email_via_smtp(to_email: str, subject: str, body: str, from_email: str = None) -> dict:
+    """
+    Send email using Brevo SMTP
+    
+    Args:
+        to_email: Recipient email address
+        subject: Email subject
+        body: Email body content
+        from_email: Sender email address (optional)
+    
+    Returns:
+        Dictionary with status and message
+    """
+    try:
+        # Get SMTP credentials from cached configuration
+        cfg = _CFG
+        smtp_server = cfg.smtp_server
+        smtp_port = cfg.smtp_port
+        smtp_login = cfg.smtp_login
+        smtp_password = cfg.smtp_password
+        smtp_from_email = cfg.from_email
+        
+        if not smtp_login or not smtp_password:
+            return {
+                "success": False,
+                "message": "SMTP credentials not found in .env file"
+            }
+        
+        # Use SMTP login as from_email if not provided
+        if not from_email:
+            from_email = smtp_from_email
+        
+        # Create message
+        msg = _build_message(from_email, to_email, subject, body)
+        
+        # Send over the pooled SMTP connection, reconnecting only if it was dropped
+        pool = _get_pool(smtp_server, smtp_port, smtp_login)
+        entry = pool.get()
+        try:
+            server = _get_or_connect(entry, smtp_server, smtp_port, smtp_login, smtp_password)
+            try:
+                server.sendmail(from_email, [to_email], msg)
+            except Exception:
+                # Drop the connection so the next send starts from a clean session
+                _close_smtp(server)
+                entry["conn"] = None
+                raise
+            entry["sent_count"] += 1
+            if entry["sent_count"] >= _CFG.smtp_max_per_conn:
+                # Recycle before the server's per-connection message cap drops us mid-burst
+                _close_smtp(server)
+                entry["conn"] = None
+            else:
+                try:
+                    server.rset()
+                    entry["last_used"] = time.monotonic()
+                except (smtplib.SMTPException, OSError):
+                    # Message is already accepted; just reconnect on the next send
+                    _close_smtp(server)
+                    entry["conn"] = None
+        finally:
+            pool.put(entry)
+        
+        return {
+            "success": True,
+            "message": f"Email sent successfully to {to_email}"
+        }
+    
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Failed to send email: {str(e)}"
+        }
+
+
+def send_emails_parallel(messages: list, from_email: str = None) -> list:
+    """
+    Send several emails in parallel, one per pooled SMTP connection
+    
+    Args:
+        messages: List of dicts with "to_email", "subject" and "body" keys
+        from_email: Sender email address applied to every message (optional)
+    
+    Returns:
+        List of send_email_via_smtp results, in the same order as messages
+    """
+    futures = [
+        _SMTP_EXECUTOR.submit(send_email_via_smtp, m["to_email"], m["subject"], m["body"], from_email)
+        for m in messages
+    ]
+    return [f.result() for f in futures]
@@ -1,25 +1,47 @@
-# server.py
-import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import asyncio
+import functools
+from collections import OrderedDict
 from fastmcp import FastMCP
-from groq import Groq
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables (always, unlike gmail.py) before _mailer
+# resolves its configuration at import
 load_dotenv()
 
+import _mailer
+from _mailer import ensure_smtp_connected, send_email_via_smtp, send_emails_parallel
+
 # Initialize MCP server
 mcp = FastMCP("Email Agent 📧")
 
-# Initialize Groq client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
+def reload_config() -> None:
+    """
+    Re-read configuration from the environment (e.g. in tests)
+    """
+    _mailer.reload_config()
+    _groq.cache_clear()
+
+
+@functools.cache
+def _groq():
+    """
+    Return the shared async Groq client, created on first use so importing
+    this module (or running only the SMTP tools) doesn't pay for it
+    """
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=_mailer._CFG.groq_api_key)
+
+
+# LRU cache of generated email bodies keyed by (context, tone), so retries
+# with identical inputs skip the LLM round-trip
+_CONTENT_CACHE = OrderedDict()
+_CONTENT_CACHE_MAX = 512
 
-def generate_email_content(context: str, tone: str = "professional") -> str:
+
+async def generate_email_content(context: str, tone: str = "professional") -> str:
     """
-    Generate email content using Groq LLM
+    Generate email content using Groq LLM, streaming the completion
     
     Args:
         context: The context or main points for the email
@@ -28,6 +50,12 @@ def generate_email_content(context: str, tone: str = "professional") -> str:
     Returns:
         Generated email content
     """
+    key = (context, tone)
+    cached = _CONTENT_CACHE.get(key)
+    if cached is not None:
+        _CONTENT_CACHE.move_to_end(key)
+        return cached
+    
     try:
         prompt = f"""You are a professional email writer. Generate a well-structured email based on the following context.
 
@@ -44,7 +72,7 @@ Requirements:
 
 Generate the email body only:"""
 
-        completion = groq_client.chat.completions.create(
+        stream = await _groq().chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[
                 {
@@ -55,80 +83,29 @@ Generate the email body only:"""
             temperature=0.7,
             max_tokens=1024,
             top_p=1,
-            stream=False
+            stream=True
         )
         
-        return completion.choices[0].message.content.strip()
-    
-    except Exception as e:
-        return f"Error generating email content: {str(e)}"
-
-
-def send_email_via_brevo(to_email: str, subject: str, body: str, from_email: str = None) -> dict:
-    """
-    Send email using Brevo SMTP
-    
-    Args:
-        to_email: Recipient email address
-        subject: Email subject
-        body: Email body content
-        from_email: Sender email address (optional)
-    
-    Returns:
-        Dictionary with status and message
-    """
-    try:
-        # Get SMTP credentials from environment
-        smtp_server = os.getenv("SMTP_SERVER", "smtp-relay.brevo.com")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_login = os.getenv("SMTP_LOGIN")
-        smtp_password = os.getenv("SMTP_PASSWORD")
-        smtp_from_email = os.getenv("SMTP_FROM_EMAIL")
-        
-        if not smtp_login or not smtp_password:
-            return {
-                "success": False,
-                "message": "SMTP credentials not found in .env file"
-            }
-        
-        # Use SMTP login as from_email if not provided
-        if not from_email:
-            from_email = smtp_from_email
-        
-        # Create message
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = from_email
-        msg["To"] = to_email
-        
-        # Add HTML and plain text parts
-        text_part = MIMEText(body, "plain")
-        html_body = body.replace("\n", "<br>")
-        html_part = MIMEText(f"<html><body>{html_body}</body></html>", "html")
+        parts = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
         
-        msg.attach(text_part)
-        msg.attach(html_part)
+        content = "".join(parts).strip()
         
-        # Connect to SMTP server and send
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_login, smtp_password)
-            server.send_message(msg)
+        # Only successful generations are cached
+        _CONTENT_CACHE[key] = content
+        if len(_CONTENT_CACHE) > _CONTENT_CACHE_MAX:
+            _CONTENT_CACHE.popitem(last=False)
         
-        return {
-            "success": True,
-            "message": f"Email sent successfully to {to_email}"
-        }
+        return content
     
     except Exception as e:
-        return {
-            "success": False,
-            "message": f"Failed to send email: {str(e)}"
-        }
+        return f"Error generating email content: {str(e)}"
 
 
 @mcp.tool()
-def send_ai_email(
+async def send_ai_email(
     to_email: str,
     subject: str,
     context: str,
@@ -148,11 +125,20 @@ def send_ai_email(
     Returns:
         Status message with email details
     """
+    # Warm up the SMTP connection (TCP + TLS + AUTH) while the LLM is generating
+    warmup = asyncio.create_task(asyncio.to_thread(ensure_smtp_connected))
+    
     # Generate email content using Groq LLM
-    email_body = generate_email_content(context, tone)
+    email_body = await generate_email_content(context, tone)
+    
+    try:
+        await warmup
+    except Exception:
+        # The send below reconnects and reports the error itself
+        pass
     
     # Send email via Brevo
-    result = send_email_via_brevo(to_email, subject, email_body, from_email)
+    result = await asyncio.to_thread(send_email_via_smtp, to_email, subject, email_body, from_email)
     
     if result["success"]:
         return f"""✅ Email Sent Successfully!
@@ -174,7 +160,7 @@ Generated Content (not sent):
 
 
 @mcp.tool()
-def send_direct_email(
+async def send_direct_email(
     to_email: str,
     subject: str,
     body: str,
@@ -192,7 +178,7 @@ def send_direct_email(
     Returns:
         Status message
     """
-    result = send_email_via_brevo(to_email, subject, body, from_email)
+    result = await asyncio.to_thread(send_email_via_smtp, to_email, subject, body, from_email)
     
     if result["success"]:
         return f"✅ {result['message']}"
@@ -200,7 +186,52 @@ def send_direct_email(
         return f"❌ {result['message']}"
 
 
+@mcp.tool()
+async def send_direct_emails_bulk(
+    messages: list[dict],
+    from_email: str = None
+) -> str:
+    """
+    Send many emails directly without AI generation, in parallel
+    
+    Args:
+        messages: List of emails, each a dict with "to_email", "subject" and "body"
+        from_email: Sender's email address (optional, defaults to SMTP login)
+    
+    Returns:
+        Status message
+    """
+    invalid = [i for i, m in enumerate(messages) if not {"to_email", "subject", "body"} <= m.keys()]
+    if invalid:
+        return f"❌ Messages at positions {invalid} must include to_email, subject and body"
+    
+    results = await asyncio.to_thread(send_emails_parallel, messages, from_email)
+    sent = sum(1 for r in results if r["success"])
+    lines = [f"{'✅' if sent == len(results) else '⚠️'} Sent {sent}/{len(results)} emails"]
+    lines += [f"❌ {m['to_email']}: {r['message']}" for m, r in zip(messages, results) if not r["success"]]
+    return "\n".join(lines)
+
+
+@mcp.tool()
+def clear_email_content_cache() -> str:
+    """
+    Clear cached AI-generated email bodies so the next request regenerates them
+    
+    Returns:
+        Status message
+    """
+    count = len(_CONTENT_CACHE)
+    _CONTENT_CACHE.clear()
+    return f"✅ Cleared {count} cached email bodies"
+
+
 if __name__ == "__main__":
+    # uvloop is faster than the stock asyncio loop but unavailable on Windows
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     print("🚀 Starting Email Agent MCP Server...")
     print("📧 Features: AI Email Generation + SMTP Sending")
     print("🔗 Server URL: http://127.0.0.1:8000/mcp")